@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+Signal analysis for clickpacks.
+
+Every sound in a clickpack archive is decoded once with FFmpeg, and the
+per-sound statistics are computed with batched NumPy operations over a
+zero-padded matrix of samples. This module has no side effects on import, so
+`analyze_pack` can be used as a process pool worker.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import zipfile
+from collections import Counter
+
+import numpy as np
+
+SOUND_EXTENSIONS = {
+    ".ogg",
+    ".mp3",
+    ".wav",
+    ".aiff",
+    ".flac",
+    ".aac",
+    ".wma",
+    ".m4a",
+    ".amr",
+    ".3gp",
+}
+BATCH_SAMPLES = 1 << 22  # max padded samples per batch (16 MiB of float32)
+ONSET_THRESHOLD = 0.1  # fraction of the peak where a sound is considered started
+SILENCE_DB = -60.0  # frames quieter than this are considered silent
+NOISE_MIN_DURATION = 1.0  # seconds; clicks are much shorter than this
+NOISE_MIN_ACTIVE = 0.8  # fraction of non-silent frames in a noise track
+NOISE_MAX_CREST = 10.0  # peak / RMS; transients have a much higher crest factor
+NOISE_FRAME = 0.05  # seconds per frame when looking for noise
+
+
+def to_db(x):
+    """Convert linear amplitude to dBFS, clamping silence to -inf-ish values."""
+    return 20.0 * np.log10(np.maximum(x, 1e-9))
+
+
+SILENT_DB = float(to_db(0.0))  # what to_db reports for digital silence
+
+
+def probe(path) -> tuple[int, int]:
+    """Return the sample rate and channel count of the first audio stream."""
+    output = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "a:0",
+            "-show_entries",
+            "stream=sample_rate,channels",
+            "-of",
+            "json",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    ).stdout
+    stream = json.loads(output)["streams"][0]
+    return int(stream["sample_rate"]), int(stream["channels"])
+
+
+def decode(path) -> np.ndarray:
+    """Decode an audio file to interleaved float32 samples at its native rate."""
+    pcm = subprocess.run(
+        ["ffmpeg", "-i", path, "-f", "f32le", "-"],
+        capture_output=True,
+        check=True,
+    ).stdout
+    return np.frombuffer(pcm, dtype=np.float32)
+
+
+def load_sounds(zip_path) -> list[tuple[str, int, int, np.ndarray]]:
+    """Decode every sound in a clickpack to (name, rate, channels, mono samples)."""
+    sounds = []
+    with zipfile.ZipFile(zip_path) as zf, tempfile.TemporaryDirectory() as tmp:
+        for name in sorted(zf.namelist()):
+            if os.path.splitext(name)[1].lower() not in SOUND_EXTENSIONS:
+                continue
+            path = zf.extract(name, tmp)
+            try:
+                sample_rate, channels = probe(path)
+                samples = decode(path)
+            except (subprocess.CalledProcessError, KeyError, IndexError, ValueError):
+                print(f"WARN: Failed to decode `{name}` in `{zip_path}`")
+                continue
+            finally:
+                os.remove(path)
+            samples = samples[: len(samples) - len(samples) % channels]
+            mono = samples.reshape(-1, channels).mean(axis=1)
+            sounds.append((name, sample_rate, channels, mono))
+    return sounds
+
+
+def batch_stats(sounds) -> dict[str, dict]:
+    """Compute duration, peak, RMS and onset delay for a batch of decoded sounds."""
+    lengths = np.array([len(s[3]) for s in sounds])
+    rates = np.array([s[1] for s in sounds], dtype=np.float64)
+    matrix = np.zeros((len(sounds), max(lengths.max(), 1)), dtype=np.float32)
+    for i, (_, _, _, mono) in enumerate(sounds):
+        matrix[i, : len(mono)] = mono
+
+    magnitude = np.abs(matrix)
+    peak = magnitude.max(axis=1)
+    rms = np.sqrt((matrix.astype(np.float64) ** 2).sum(axis=1) / np.maximum(lengths, 1))
+    started = magnitude >= (peak * ONSET_THRESHOLD)[:, None]
+    onset = np.where(peak > 0, started.argmax(axis=1), 0) / rates
+
+    return {
+        name: {
+            "duration": round(float(lengths[i] / rates[i]), 4),
+            "peak_db": round(float(to_db(peak[i])), 2),
+            "rms_db": round(float(to_db(rms[i])), 2),
+            "onset_delay": round(float(onset[i]), 4),
+            "sample_rate": sample_rate,
+            "channels": channels,
+        }
+        for i, (name, sample_rate, channels, _) in enumerate(sounds)
+    }
+
+
+def is_noise(mono: np.ndarray, sample_rate: int) -> bool:
+    """Tell a sustained noise track apart from a click by its signal."""
+    if len(mono) < NOISE_MIN_DURATION * sample_rate:
+        return False
+    frame = max(int(NOISE_FRAME * sample_rate), 1)
+    frames = mono[: len(mono) - len(mono) % frame].reshape(-1, frame)
+    frame_rms = np.sqrt((frames.astype(np.float64) ** 2).mean(axis=1))
+    active = (to_db(frame_rms) > SILENCE_DB).mean()
+    rms = np.sqrt((mono.astype(np.float64) ** 2).mean())
+    crest = np.abs(mono).max() / max(rms, 1e-9)
+    return bool(active >= NOISE_MIN_ACTIVE and crest <= NOISE_MAX_CREST)
+
+
+def summarize(stats: dict[str, dict]) -> dict:
+    """Reduce per-sound statistics to aggregate statistics for a clickpack."""
+    # empty and silent sounds would drag every average down to the silence floor
+    audible = [
+        s for s in stats.values() if s["duration"] > 0 and s["peak_db"] > SILENT_DB
+    ]
+    clicks = [s for s in audible if not s["noise"]] or audible or list(stats.values())
+    durations = np.array([s["duration"] for s in clicks])
+    peaks = np.array([s["peak_db"] for s in clicks])
+    power = 10.0 ** (np.array([s["rms_db"] for s in clicks]) / 10.0)
+    onsets = np.array([s["onset_delay"] for s in clicks])
+    return {
+        "duration_avg": round(float(durations.mean()), 4),
+        "duration_max": round(float(durations.max()), 4),
+        "peak_db": round(float(peaks.max()), 2),
+        # average the power of the sounds, not their levels in dB
+        "rms_db": round(float(10.0 * np.log10(max(power.mean(), 1e-18))), 2),
+        "onset_delay_avg": round(float(onsets.mean()), 4),
+        "sample_rate": Counter(s["sample_rate"] for s in clicks).most_common(1)[0][0],
+        "channels": max(s["channels"] for s in clicks),
+        "noise_files": sorted(name for name, s in stats.items() if s["noise"]),
+    }
+
+
+def analyze_pack(zip_path) -> dict | None:
+    """
+    Analyze every sound in a clickpack archive.
+
+    Returns a dict with per-sound statistics under `sounds` and aggregate
+    statistics under `summary`, or None if the archive has no decodable sounds.
+    """
+    sounds = load_sounds(zip_path)
+    if not sounds:
+        return None
+
+    # sort by length so each batch wastes as little padding as possible
+    sounds.sort(key=lambda s: len(s[3]))
+    stats = {}
+    batch = []
+    for sound in sounds:
+        if batch and len(sound[3]) * (len(batch) + 1) > BATCH_SAMPLES:
+            stats.update(batch_stats(batch))
+            batch = []
+        batch.append(sound)
+    stats.update(batch_stats(batch))
+
+    for name, sample_rate, _, mono in sounds:
+        stats[name]["noise"] = is_noise(mono, sample_rate)
+
+    stats = {name: stats[name] for name in sorted(stats)}
+    return {"sounds": stats, "summary": summarize(stats)}
@@ -21,33 +21,45 @@ def convert_to_ogg(src_path, out_path):
     command = ['ffmpeg', '-i', src_path, '-y', '-flags', 'bitexact', '-acodec', 'libvorbis', out_path]
     print(f'CONVERT {src_path} to {out_path}...')
     with open(os.devnull, 'wb') as devnull:
-        subprocess.run(command, stdout=devnull, stderr=devnull, check=True)
+        try:
+            subprocess.run(command, stdout=devnull, stderr=devnull, check=True)
+        except subprocess.CalledProcessError:
+            # don't leave a partial file behind, a retry would skip it
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            raise
     print(f'DONE    {src_path} to {out_path}')
 
+def convert_directory(src_dir, out_dir, executor):
+    """Submit conversions of `src_dir` into `out_dir` to `executor` and return the futures."""
+    futures = []
+    for root, _, files in os.walk(src_dir):
+        for file in files:
+            # construct full file path
+            src_path = os.path.join(root, file)
+            # construct corresponding output path
+            relative_path = os.path.relpath(src_path, src_dir)
+            out_path = os.path.join(out_dir, relative_path)
+            # create output directory if it doesn't exist
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            # check if the file has an audio extension
+            _, ext = os.path.splitext(file)
+            if ext.lower() in AUDIO_EXTENSIONS:
+                # change the extension to .ogg
+                out_path = os.path.splitext(out_path)[0] + '.ogg'
+                if os.path.exists(out_path):
+                    print(f'SKIP    {src_path} to {out_path}...')
+                    continue
+                # convert the file
+                futures.append(executor.submit(convert_to_ogg, src_path, out_path))
+            elif not any(file.endswith(ext) for ext in ARCHIVE_EXTENSIONS):
+                # copy the file as is
+                shutil.copy2(src_path, out_path)
+    return futures
+
 def process_directory(src_dir, out_dir):
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        for root, _, files in os.walk(src_dir):
-            for file in files:
-                # construct full file path
-                src_path = os.path.join(root, file)
-                # construct corresponding output path
-                relative_path = os.path.relpath(src_path, src_dir)
-                out_path = os.path.join(out_dir, relative_path)
-                # create output directory if it doesn't exist
-                os.makedirs(os.path.dirname(out_path), exist_ok=True)
-                # check if the file has an audio extension
-                _, ext = os.path.splitext(file)
-                if ext.lower() in AUDIO_EXTENSIONS:
-                    # change the extension to .ogg
-                    out_path = os.path.splitext(out_path)[0] + '.ogg'
-                    if os.path.exists(out_path):
-                        print(f'SKIP    {src_path} to {out_path}...')
-                        continue
-                    # convert the file
-                    executor.submit(convert_to_ogg, src_path, out_path)
-                elif not any(file.endswith(ext) for ext in ARCHIVE_EXTENSIONS):
-                    # copy the file as is
-                    shutil.copy2(src_path, out_path)
+        convert_directory(src_dir, out_dir, executor)
 
 def analyze_archive_structure(file_names):
     """Analyze archive structure to determine if it has a single root directory."""
@@ -101,33 +113,37 @@ def extract_archive(file_path, src_dir, file_names, archive_obj):
         os.makedirs(extract_path, exist_ok=True)
         archive_obj.extractall(extract_path)
 
+def unzip_file(file_path, src_dir):
+    """Extract a single archive from `src_dir` into a directory named after it."""
+    file = os.path.basename(file_path)
+    file_ext = os.path.splitext(file)[1].lower()
+
+    if file_ext == '.zip' and zipfile.is_zipfile(file_path):
+        print(f'UNZIPPING ZIP {file_path}...')
+        with zipfile.ZipFile(file_path) as zf:
+            extract_archive(file_path, src_dir, zf.namelist(), zf)
+
+    elif file_ext == '.rar' and rarfile.is_rarfile(file_path):
+        print(f'UNZIPPING RAR {file_path}...')
+        with rarfile.RarFile(file_path) as rf:
+            extract_archive(file_path, src_dir, rf.namelist(), rf)
+
+    elif file_ext == '.7z':
+        print(f'UNZIPPING 7Z {file_path}...')
+        with py7zr.SevenZipFile(file_path, mode='r') as szf:
+            # py7zr returns a list of ArchiveInfo objects, we need the filenames
+            file_names = [info.filename for info in szf.list()]
+            extract_archive(file_path, src_dir, file_names, szf)
+
+    print(f'DONE {file}')
+
 def unzip_files(src_dir):
     print(f'UNZIPPING files in {src_dir}...')
     for file in os.listdir(src_dir):
         file_path = os.path.join(src_dir, file)
         if not os.path.isfile(file_path):
             continue
-
-        file_ext = os.path.splitext(file)[1].lower()
-        
-        if file_ext == '.zip' and zipfile.is_zipfile(file_path):
-            print(f'UNZIPPING ZIP {file_path}...')
-            with zipfile.ZipFile(file_path) as zf:
-                extract_archive(file_path, src_dir, zf.namelist(), zf)
-                
-        elif file_ext == '.rar' and rarfile.is_rarfile(file_path):
-            print(f'UNZIPPING RAR {file_path}...')
-            with rarfile.RarFile(file_path) as rf:
-                extract_archive(file_path, src_dir, rf.namelist(), rf)
-                
-        elif file_ext == '.7z':
-            print(f'UNZIPPING 7Z {file_path}...')
-            with py7zr.SevenZipFile(file_path, mode='r') as szf:
-                # py7zr returns a list of ArchiveInfo objects, we need the filenames
-                file_names = [info.filename for info in szf.list()]
-                extract_archive(file_path, src_dir, file_names, szf)
-
-        print(f'DONE {file}')
+        unzip_file(file_path, src_dir)
 
 if __name__ == '__main__':
     unzip_files(SRC_DIR)
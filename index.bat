@@ -1,4 +1,3 @@
 @echo off
-python audio2ogg.py
-python index.py
+python pipeline.py
 pause
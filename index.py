@@ -33,11 +33,39 @@ import hashlib
 import json
 import os
 import shutil
+import subprocess
+import sys
+import tempfile
 import urllib.parse
+import zipfile
+from array import array
 from datetime import datetime, timezone
 
 from repro_zipfile import ReproducibleZipFile
 
+import analyze
+
+
+def parse_shard(value) -> tuple[int, int]:
+    try:
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard `{value}`, expected K/N")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}")
+    return index, count
+
+
+def parse_shard_count(value) -> int:
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard count `{value}`")
+    if count < 1:
+        raise argparse.ArgumentTypeError("shard count must be at least 1")
+    return count
+
+
 parser = argparse.ArgumentParser(description="ClickpackDB Indexer")
 parser.add_argument("--src", type=str, default="ogg", help="Source directory")
 parser.add_argument("--dst", type=str, default="out", help="Destination directory")
@@ -52,60 +80,132 @@ parser.add_argument(
     default="https://hiatus.ruikasa.lol",
     help="Hiatus API endpoint",
 )
+parser.add_argument(
+    "--previews", type=str, default="previews", help="Preview output directory"
+)
+parser.add_argument(
+    "--no-previews", action="store_true", help="Skip generating audio previews"
+)
+parser.add_argument(
+    "--analysis-cache",
+    type=str,
+    default="analysis.json",
+    help="Per-sound analysis cache filename",
+)
+parser.add_argument(
+    "--no-analysis", action="store_true", help="Skip analyzing clickpack audio"
+)
+parser.add_argument(
+    "--shard",
+    type=parse_shard,
+    metavar="K/N",
+    help="Rebuild only shard K of N (0-based) into a partial database",
+)
+parser.add_argument(
+    "--merge",
+    type=parse_shard_count,
+    metavar="N",
+    help="Merge the partial databases of N shards into the database",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    help="Maximum number of concurrent workers per stage (default: per CPU)",
+)
+parser.add_argument(
+    "--allow-drop",
+    action="store_true",
+    help="Let `--merge` drop clickpacks no shard rebuilt, deleting their files",
+)
 parser.add_argument(
     "--delete-dirs",
     action="store_false",
     help="Remove indexed folders in db directory and clear ogg directory",
 )
-args = parser.parse_args()
 
-SRC_DIR = args.src
-DST_DIR = args.dst
 NOISE_FILES = ["noise", "whitenoise", "pcnoise", "background", "silence"]
-DB_FILENAME = args.db
-DEBUG_DB = args.debug
 BASE_URL = "https://github.com/zeozeozeo/clickpack-db/raw/main/out/"
-DELETE_DUPLICATES = args.delete_duplicates
-HIATUS_ENDPOINT = args.hiatus_endpoint.strip("/")
-DEFAULT_DB = db = {
+PREVIEW_BASE_URL = "https://github.com/zeozeozeo/clickpack-db/raw/main/previews/"
+DEFAULT_DB = {
     "updated_at_iso": "",
     "updated_at_unix": 0,
     "version": 0,
     "clickpacks": {},
-    "hiatus": HIATUS_ENDPOINT,
 }
 BUF_SIZE = 65536  # for checksums
+PREVIEW_CLICKS = 6  # how many sounds to put in a preview
+PREVIEW_CLICK_LEN = 0.35  # seconds of each sound to keep
+PREVIEW_CLICK_GAP = 0.15  # seconds of silence after each sound
+PREVIEW_BITRATE = "24k"
+PREVIEW_WAVEFORM_POINTS = 64
+PREVIEW_WAVEFORM_RATE = 8000  # decoding rate for the waveform thumbnail
+
+
+def load_db(filename, hiatus_endpoint) -> dict:
+    """Load `filename` if it exists, filling in any missing top-level keys."""
+    db = {}
+    if os.path.exists(filename):
+        print(f"Loading `{filename}`...")
+        with open(filename, "r", encoding="utf-8") as f:
+            db = json.load(f)
+    for k, v in {**DEFAULT_DB, "hiatus": hiatus_endpoint}.items():
+        if k not in db:
+            print(f"Adding default entry for key `{k}`: {v}")
+            db[k] = v
+    print(f"Initial database consists of {len(db['clickpacks'])} entries")
+
+    for k in db["clickpacks"]:
+        # encode urls properly
+        db["clickpacks"][k]["url"] = BASE_URL + urllib.parse.quote(k) + ".zip"
+    return db
+
+
+def sort_db(db):
+    # sort database alphabetically (case-insensitive)
+    db["clickpacks"] = {
+        k: db["clickpacks"][k] for k in sorted(db["clickpacks"], key=str.lower)
+    }
+
+
+def bump_version(db):
+    # set current time
+    now = datetime.now(timezone.utc)
+    db["updated_at_iso"] = now.isoformat()
+    db["updated_at_unix"] = int(round(now.timestamp()))
+    db["version"] += 1
+    print("Updated at: " + db["updated_at_iso"])
 
-# load db.json if it exists
-db = {}
-if os.path.exists(DB_FILENAME):
-    print(f"Loading `{DB_FILENAME}`...")
-    with open(DB_FILENAME, "r", encoding="utf-8") as f:
-        db = json.load(f)
-for k, v in DEFAULT_DB.items():
-    if k not in db:
-        print(f"Adding default entry for key `{k}`: {v}")
-        db[k] = v
-print(f"Initial database consists of {len(db['clickpacks'])} entries")
 
+def save_db(db, filename, debug=False) -> str:
+    actual_filename = filename
+    if debug:
+        actual_filename = "debug_" + filename
+    # write to a temporary file first, so an interrupted save never leaves
+    # a truncated database behind
+    tmp_filename = actual_filename + ".tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        json.dump(db, f, indent=4)
+    os.replace(tmp_filename, actual_filename)
+    return actual_filename
 
-for k in db["clickpacks"]:
-    # encode urls properly
-    db["clickpacks"][k]["url"] = BASE_URL + urllib.parse.quote(k) + ".zip"
 
-try:
-    os.mkdir(DST_DIR)
-except:
-    pass
+def shard_of(name, count) -> int:
+    """Deterministically assign a clickpack to one of `count` shards."""
+    digest = hashlib.md5(name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
 
-print(f"Source directory: {SRC_DIR}")
-print(f"Destination directory: {DST_DIR}")
 
+def shard_filename(filename, index, count) -> str:
+    """`db.json` => `db.shard-0-of-4.json`"""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.shard-{index}-of-{count}{ext}"
 
-def get_info(path) -> tuple[int, bool, str]:
+
+def get_info(path) -> tuple[int, bool, str, int]:
     total = 0
     has_noise = False
     readme = ""
+    sound_count = 0
     for dirpath, _, filenames in os.walk(path):
         for ff in filenames:
             fp = os.path.join(dirpath, ff)
@@ -122,8 +222,11 @@ def get_info(path) -> tuple[int, bool, str]:
                     with open(fp, "r", encoding="utf-8") as file:
                         readme = file.read()
 
+                if os.path.splitext(ff)[1].lower() in analyze.SOUND_EXTENSIONS:
+                    sound_count += 1
+
                 total += os.path.getsize(fp)
-    return total, has_noise, readme
+    return total, has_noise, readme, sound_count
 
 
 def human_size(num, suffix="B"):
@@ -135,42 +238,263 @@ def human_size(num, suffix="B"):
     return f"{num:.1f}Yi{suffix}"
 
 
-dups = []
-zips = []  # [(dir_name, zip_path)]
-
-
-def zip_dir(dir_name):
-    dir_path = os.path.join(SRC_DIR, dir_name)
+def md5_file(path) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(BUF_SIZE)
+            if not data:
+                break
+            md5.update(data)
+    return md5.hexdigest()
+
+
+def pick_preview_sounds(names) -> list[str]:
+    """Pick a few representative sounds, spread evenly across the pack."""
+    sounds = sorted(
+        name
+        for name in names
+        if os.path.splitext(name)[1].lower() in analyze.SOUND_EXTENSIONS
+        and not any(n in os.path.basename(name).lower() for n in NOISE_FILES)
+    )
+    # prefer actual clicks over releases if the pack has both
+    clicks = [s for s in sounds if "release" not in s.lower()]
+    if len(clicks) >= PREVIEW_CLICKS:
+        sounds = clicks
+    if len(sounds) <= PREVIEW_CLICKS:
+        return sounds
+    step = len(sounds) / PREVIEW_CLICKS
+    return [sounds[int(i * step)] for i in range(PREVIEW_CLICKS)]
+
+
+def waveform_peaks(path) -> list[int]:
+    """Decode `path` to mono PCM and reduce it to a list of peaks in 0..100."""
+    pcm = subprocess.run(
+        [
+            "ffmpeg",
+            "-i",
+            path,
+            "-ac",
+            "1",
+            "-ar",
+            str(PREVIEW_WAVEFORM_RATE),
+            "-f",
+            "s16le",
+            "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    ).stdout
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) - len(pcm) % 2])
+    if len(samples) == 0:
+        return [0] * PREVIEW_WAVEFORM_POINTS
+    peaks = []
+    for i in range(PREVIEW_WAVEFORM_POINTS):
+        start = i * len(samples) // PREVIEW_WAVEFORM_POINTS
+        end = max((i + 1) * len(samples) // PREVIEW_WAVEFORM_POINTS, start + 1)
+        chunk = samples[start:end]
+        peaks.append(max(max(chunk), -min(chunk)))
+    loudest = max(peaks) or 1
+    return [round(p * 100 / loudest) for p in peaks]
+
+
+def make_preview(name, zip_path, preview_path) -> dict | None:
+    """Concatenate a few sounds from a clickpack into one short, low-bitrate file."""
+    with zipfile.ZipFile(zip_path) as zf:
+        sounds = pick_preview_sounds(zf.namelist())
+        if not sounds:
+            print(f"WARN: `{name}` has no sounds to preview")
+            return None
+        with tempfile.TemporaryDirectory() as tmp:
+            command = ["ffmpeg", "-y"]
+            filters = []
+            for i, sound in enumerate(sounds):
+                command += ["-i", zf.extract(sound, tmp)]
+                filters.append(
+                    f"[{i}:a]aformat=channel_layouts=mono,"
+                    f"atrim=0:{PREVIEW_CLICK_LEN},"
+                    f"apad=pad_dur={PREVIEW_CLICK_GAP}[a{i}]"
+                )
+            inputs = "".join(f"[a{i}]" for i in range(len(sounds)))
+            filters.append(f"{inputs}concat=n={len(sounds)}:v=0:a=1[out]")
+            command += [
+                "-filter_complex",
+                ";".join(filters),
+                "-map",
+                "[out]",
+                "-map_metadata",
+                "-1",
+                "-flags",
+                "bitexact",
+                "-acodec",
+                "libopus",
+                "-b:a",
+                PREVIEW_BITRATE,
+                preview_path,
+            ]
+            subprocess.run(
+                command,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+
+    return {
+        "url": PREVIEW_BASE_URL + urllib.parse.quote(name) + ".ogg",
+        "size": os.path.getsize(preview_path),
+        "checksum": md5_file(preview_path),
+        "pack_checksum": md5_file(zip_path),
+        "waveform": waveform_peaks(preview_path),
+    }
+
+
+def update_preview(db, name, dst_dir, preview_dir) -> bool:
+    """Regenerate the preview of `name` if needed. Returns True if it changed."""
+    entry = db["clickpacks"][name]
+    zip_path = os.path.join(dst_dir, name + ".zip")
+    preview_path = os.path.join(preview_dir, name + ".ogg")
+    if not os.path.exists(zip_path):
+        print(f"WARN: archive not found for `{name}`, skipping preview")
+        return False
+
+    # only rebuild the preview if the clickpack itself changed
+    preview = entry.get("preview")
+    if (
+        preview is not None
+        and preview.get("pack_checksum") == entry.get("checksum")
+        and os.path.exists(preview_path)
+    ):
+        return False
+
+    # render to a temporary file so a failed run can't clobber the old preview
+    tmp_path = os.path.join(preview_dir, name + ".tmp.ogg")
+    try:
+        preview = make_preview(name, zip_path, tmp_path)
+        if preview is not None:
+            os.replace(tmp_path, preview_path)
+    except (subprocess.CalledProcessError, zipfile.BadZipFile, OSError) as e:
+        print(f"WARN: Failed to generate preview for `{name}`: {e}")
+        preview = None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if preview is None:
+        # the old preview, if any, no longer matches the clickpack
+        return entry.pop("preview", None) is not None
+    print(f"Generated preview for `{name}` ({human_size(preview['size'])})")
+    entry["preview"] = preview
+    return True
+
+
+def apply_analysis(entry, analysis, checksum):
+    entry["analysis"] = {"pack_checksum": checksum, **analysis["summary"]}
+    # the signal knows better than the filenames
+    entry["has_noise"] = len(analysis["summary"]["noise_files"]) > 0
+
+
+def analyze_packs(
+    db, dst_dir, cache_filename, output_filename=None, workers=None
+) -> list[str]:
+    """
+    Analyze the audio of every clickpack whose analysis is missing or outdated.
+
+    Results are cached in `cache_filename` by clickpack checksum, so only new
+    or changed clickpacks are decoded. The updated cache is written to
+    `output_filename` (defaults to `cache_filename`). Returns the names of
+    updated clickpacks.
+    """
+    cache = {}
+    if os.path.exists(cache_filename):
+        with open(cache_filename, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+
+    updated = []
+    todo = {}  # {dir_name: zip_path}
+    for name, entry in db["clickpacks"].items():
+        checksum = entry.get("checksum")
+        analysis = entry.get("analysis")
+        if checksum is None or (
+            analysis is not None and analysis.get("pack_checksum") == checksum
+        ):
+            continue
+        if checksum in cache:
+            apply_analysis(entry, cache[checksum], checksum)
+            updated.append(name)
+            continue
+        zip_path = os.path.join(dst_dir, name + ".zip")
+        if not os.path.exists(zip_path):
+            print(f"WARN: archive not found for `{name}`, skipping analysis")
+            continue
+        todo[name] = zip_path
+
+    print(f"Analyzing {len(todo)} clickpack(s), {len(updated)} found in cache...")
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = {
+            executor.submit(analyze.analyze_pack, zip_path): name
+            for name, zip_path in todo.items()
+        }
+        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+            name = futures[future]
+            print(f"({i + 1}/{len(todo)}) Analyzed `{name}`")
+            try:
+                analysis = future.result()
+            except (subprocess.CalledProcessError, zipfile.BadZipFile, OSError) as e:
+                print(f"WARN: Failed to analyze `{name}`: {e}")
+                continue
+            if analysis is None:
+                print(f"WARN: `{name}` has no decodable sounds")
+                continue
+            checksum = db["clickpacks"][name]["checksum"]
+            cache[checksum] = analysis
+            apply_analysis(db["clickpacks"][name], analysis, checksum)
+            updated.append(name)
+
+    # drop results for clickpacks that no longer exist
+    checksums = {entry.get("checksum") for entry in db["clickpacks"].values()}
+    cache = {k: v for k, v in sorted(cache.items()) if k in checksums}
+    with open(output_filename or cache_filename, "w", encoding="utf-8") as f:
+        json.dump(cache, f, separators=(",", ":"))
+    return updated
+
+
+def zip_dir(db, dir_name, src_dir, dst_dir, delete_duplicates=False):
+    """
+    Zip `dir_name` from `src_dir` into `dst_dir` and add it to the database.
+
+    Returns the zip path, "" if the clickpack is a duplicate, or None if it
+    was skipped.
+    """
+    dir_path = os.path.join(src_dir, dir_name)
 
     if os.path.isdir(dir_path):
         if dir_name in db["clickpacks"]:
             print(f"WARN: Skipping `{dir_name}`: key already in database")
-            return
+            return None
         print(f"Zipping `{dir_name}`...")
 
-        initial_size, has_noise, readme = get_info(dir_path)
+        initial_size, has_noise, readme, sound_count = get_info(dir_path)
 
         if initial_size in map(
-            lambda v: v["uncompressed_size"], db["clickpacks"].values()
+            lambda v: v["uncompressed_size"], list(db["clickpacks"].values())
         ):
             print(f"Found duplicate `{dir_name}` (size: {initial_size})")
-            dups.append(dir_name)
-            if DELETE_DUPLICATES:
-                print(f"Deleting duplicate `{dir_name}` from `{SRC_DIR}`...")
+            if delete_duplicates:
+                print(f"Deleting duplicate `{dir_name}` from `{src_dir}`...")
                 shutil.rmtree(dir_path)
-            return
+            return ""
 
         if has_noise:
             print(f"Clickpack `{dir_name}` has a noise file")
 
-        zip_path = os.path.join(DST_DIR, dir_name + ".zip")
+        zip_path = os.path.join(dst_dir, dir_name + ".zip")
         with ReproducibleZipFile(zip_path, "w") as zf:
             for root, _, files in os.walk(dir_path):
                 for file in sorted(files):
                     full_path = os.path.join(root, file)
                     arcname = os.path.relpath(full_path, dir_path)
                     zf.write(full_path, arcname=arcname)
-        zips.append((dir_name, zip_path))
 
         final_size = os.path.getsize(zip_path)
         print(
@@ -182,6 +506,7 @@ def zip_dir(dir_name):
             "size": final_size,
             "uncompressed_size": initial_size,
             "has_noise": has_noise,
+            "sound_count": sound_count,
             "url": BASE_URL + urllib.parse.quote(dir_name) + ".zip",
             "added_at": now.isoformat(),
         }
@@ -190,93 +515,303 @@ def zip_dir(dir_name):
             print(f"Clickpack `{dir_name}` has a readme: {readme}")
             entry["readme"] = readme
         db["clickpacks"][dir_name] = entry
+        return zip_path
+    return None
+
+
+def clear_dir(path, keep=()):
+    for item in os.listdir(path):
+        item_path = os.path.join(path, item)
+        if item in keep:
+            continue
+        if os.path.isdir(item_path):
+            print(f"Removing directory: {item}")
+            shutil.rmtree(item_path)
+        elif os.path.isfile(item_path):
+            print(f"Removing file: {item}")
+            os.remove(item_path)
+
+
+def carry_over(base, db, names):
+    """Keep the addition date, preview and analysis of rebuilt clickpacks."""
+    for name in names:
+        old = base["clickpacks"].get(name)
+        if old is None:
+            continue
+        entry = db["clickpacks"][name]
+        for k in ("added_at", "preview"):
+            if k in old:
+                entry[k] = old[k]
+        # the analysis (and the has_noise derived from it) still holds if the
+        # rebuilt zip is identical
+        analysis = old.get("analysis")
+        if analysis is not None and analysis.get("pack_checksum") == entry["checksum"]:
+            summary = {k: v for k, v in analysis.items() if k != "pack_checksum"}
+            apply_analysis(entry, {"summary": summary}, entry["checksum"])
+
+
+def merge_shards(
+    db_filename,
+    count,
+    hiatus_endpoint,
+    cache_filename,
+    dst_dir,
+    preview_dir,
+    allow_drop=False,
+    debug=False,
+):
+    """Combine the partial databases of `count` shards into the final database."""
+    db = load_db(db_filename, hiatus_endpoint)
+    clickpacks = {}
+    cache = {}
+    for index in range(count):
+        filename = shard_filename(db_filename, index, count)
+        if not os.path.exists(filename):
+            print(f"Error: partial database `{filename}` not found")
+            sys.exit(1)
+        print(f"Loading `{filename}`...")
+        with open(filename, "r", encoding="utf-8") as f:
+            partial = json.load(f)
+
+        if partial.get("shard") != {"index": index, "count": count}:
+            print(f"Error: `{filename}` is not shard {index}/{count}")
+            sys.exit(1)
+        for name, entry in partial["clickpacks"].items():
+            if name in clickpacks:
+                print(f"Error: `{name}` is in more than one shard")
+                sys.exit(1)
+            if shard_of(name, count) != index:
+                print(f"Error: `{name}` does not belong to shard {index}/{count}")
+                sys.exit(1)
+            clickpacks[name] = entry
+
+        partial_cache = shard_filename(cache_filename, index, count)
+        if os.path.exists(partial_cache):
+            with open(partial_cache, "r", encoding="utf-8") as f:
+                cache.update(json.load(f))
+
+    # shards can only find duplicates within themselves
+    sizes = {}
+    for name, entry in clickpacks.items():
+        if entry["uncompressed_size"] in sizes:
+            print(
+                f"WARN: `{name}` has the same size as `{sizes[entry['uncompressed_size']]}`, possible duplicate"
+            )
+        sizes[entry["uncompressed_size"]] = name
+
+    # a shard only sees what is in its source directory, so anything missing
+    # there would silently disappear from the database
+    dropped = [name for name in db["clickpacks"] if name not in clickpacks]
+    if dropped and not allow_drop:
+        print(
+            f"Error: {len(dropped)} clickpack(s) were not rebuilt by any shard: {', '.join(dropped)}"
+        )
+        print("Pass `--allow-drop` to remove them from the database")
+        sys.exit(1)
+    for name in dropped:
+        print(f"Dropping `{name}`, which was not rebuilt by any shard")
+        for path in (
+            os.path.join(dst_dir, name + ".zip"),
+            os.path.join(preview_dir, name + ".ogg"),
+        ):
+            if os.path.exists(path):
+                print(f"Removing file: {path}")
+                os.remove(path)
 
+    changed = clickpacks != db["clickpacks"]
+    db["clickpacks"] = clickpacks
+    sort_db(db)
 
-with concurrent.futures.ThreadPoolExecutor() as executor:
-    executor.map(zip_dir, os.listdir(SRC_DIR))
+    # only update timestamp and version if the rebuild changed anything
+    if changed:
+        bump_version(db)
+        print(
+            f"Merged {len(clickpacks)} clickpack(s) from {count} shard(s), incremented version to {db['version']}"
+        )
+    else:
+        print(
+            f"Merged {len(clickpacks)} clickpack(s) from {count} shard(s), nothing changed, keeping existing timestamp and version"
+        )
 
-print(f"\nRemoved {len(dups)} duplicates in total: {', '.join(dups)}")
+    db["hiatus"] = hiatus_endpoint
+    actual_filename = save_db(db, db_filename, debug)
+    print(
+        f"Final database consists of {len(db['clickpacks'])} entries and is saved to `{actual_filename}`"
+    )
+
+    if cache:
+        if os.path.exists(cache_filename):
+            with open(cache_filename, "r", encoding="utf-8") as f:
+                cache = {**json.load(f), **cache}
+        checksums = {entry.get("checksum") for entry in clickpacks.values()}
+        cache = {k: v for k, v in sorted(cache.items()) if k in checksums}
+        with open(cache_filename, "w", encoding="utf-8") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        print(f"Merged analysis cache is saved to `{cache_filename}`")
+
+    # the partial files are merged now, and a later merge must not pick them up
+    for index in range(count):
+        for filename in (
+            shard_filename(db_filename, index, count),
+            shard_filename(cache_filename, index, count),
+        ):
+            if os.path.exists(filename):
+                os.remove(filename)
+    print(f"Removed the partial files of {count} shard(s)")
+
+
+def main():
+    args = parser.parse_args()
+    src_dir = args.src
+    dst_dir = args.dst
+    hiatus_endpoint = args.hiatus_endpoint.strip("/")
+
+    if args.merge is not None:
+        merge_shards(
+            args.db,
+            args.merge,
+            hiatus_endpoint,
+            args.analysis_cache,
+            dst_dir,
+            args.previews,
+            args.allow_drop,
+            args.debug,
+        )
+        return
+
+    db = load_db(args.db, hiatus_endpoint)
+
+    # a shard rebuilds its clickpacks from scratch into a partial database,
+    # which is combined with the others by `--merge`
+    base = None
+    analysis_output = args.analysis_cache
+    if args.shard is not None:
+        index, count = args.shard
+        print(f"Building shard {index}/{count}")
+        base = db
+        db = {"shard": {"index": index, "count": count}, "clickpacks": {}}
+        analysis_output = shard_filename(args.analysis_cache, index, count)
+        # don't let a leftover from an earlier run be merged with this one
+        if os.path.exists(analysis_output):
+            os.remove(analysis_output)
+
+    os.makedirs(dst_dir, exist_ok=True)
+    if not args.no_previews:
+        os.makedirs(args.previews, exist_ok=True)
+
+    print(f"Source directory: {src_dir}")
+    print(f"Destination directory: {dst_dir}")
+
+    dups = []
+    zips = []  # [(dir_name, zip_path)]
+    dir_names = os.listdir(src_dir)
+    if args.shard is not None:
+        dir_names = [d for d in dir_names if shard_of(d, count) == index]
+    with concurrent.futures.ThreadPoolExecutor(args.workers) as executor:
+        results = executor.map(
+            lambda dir_name: zip_dir(
+                db, dir_name, src_dir, dst_dir, args.delete_duplicates
+            ),
+            dir_names,
+        )
+        for dir_name, zip_path in zip(dir_names, results):
+            if zip_path == "":
+                dups.append(dir_name)
+            elif zip_path is not None:
+                zips.append((dir_name, zip_path))
 
-for i, (dir_name, zip_path) in enumerate(zips):
-    print(f"({i + 1}/{len(zips)}) Calculating checksums...", end="\r")
-    md5 = hashlib.md5()
-    with open(zip_path, "rb") as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
-            md5.update(data)
-    db["clickpacks"][dir_name]["checksum"] = md5.hexdigest()
+    print(f"\nRemoved {len(dups)} duplicates in total: {', '.join(dups)}")
 
-print()
+    for i, (dir_name, zip_path) in enumerate(zips):
+        print(f"({i + 1}/{len(zips)}) Calculating checksums...", end="\r")
+        db["clickpacks"][dir_name]["checksum"] = md5_file(zip_path)
 
-# sort database alphabetically (case-insensitive)
-db["clickpacks"] = {
-    k: db["clickpacks"][k] for k in sorted(db["clickpacks"], key=str.lower)
-}
+    print()
 
-# only update timestamp and version if new clickpacks were added
-if len(zips) > 0:
-    # set current time
-    now = datetime.now(timezone.utc)
-    db["updated_at_iso"] = now.isoformat()
-    db["updated_at_unix"] = int(round(now.timestamp()))
-    db["version"] += 1
-    print("Updated at: " + db["updated_at_iso"])
-    print(f"Added {len(zips)} new clickpack(s), incremented version to {db['version']}")
-else:
-    print("No new clickpacks were added, keeping existing timestamp and version")
-
-db["hiatus"] = HIATUS_ENDPOINT
-
-actual_filename = DB_FILENAME
-if DEBUG_DB:
-    actual_filename = "debug_" + DB_FILENAME
-with open(os.path.join(actual_filename), "w", encoding="utf-8") as f:
-    json.dump(db, f, indent=4)
-print(
-    f"Final database consists of {len(db['clickpacks'])} entries and is saved to `{actual_filename}`"
-)
-total_size = sum(map(lambda x: x["size"], db["clickpacks"].values()))
-total_uncomp_size = sum(
-    map(lambda x: x["uncompressed_size"], db["clickpacks"].values())
-)
-print(f"Total database size (compressed): {human_size(total_size)}")
-print(f"Total database size (uncompressed): {human_size(total_uncomp_size)}")
-
-if args.delete_dirs:
-    print("\n" + "=" * 50)
-    print("Delete directories mode enabled - cleaning up after indexing")
-
-    # Clear ogg directory
-    if os.path.exists(SRC_DIR):
-        print(f"Clearing contents of {SRC_DIR} directory...")
-        for item in os.listdir(SRC_DIR):
-            item_path = os.path.join(SRC_DIR, item)
-            if os.path.isdir(item_path):
-                print(f"Removing directory: {item}")
-                shutil.rmtree(item_path)
-            elif os.path.isfile(item_path):
-                print(f"Removing file: {item}")
-                os.remove(item_path)
-        print(f"Cleared {SRC_DIR} directory")
+    if base is not None:
+        carry_over(base, db, [dir_name for dir_name, _ in zips])
+
+    previews = []  # [dir_name]
+    if args.no_previews:
+        print("Skipping audio previews")
+    elif shutil.which("ffmpeg") is None:
+        print("WARN: FFmpeg not found, skipping audio previews")
     else:
-        print(f"Source directory {SRC_DIR} does not exist")
-
-    # Clear db directory
-    db_dir = "db"
-    if os.path.exists(db_dir):
-        print(f"Clearing contents of {db_dir} directory...")
-        for item in os.listdir(db_dir):
-            item_path = os.path.join(db_dir, item)
-            if os.path.isdir(item_path):
-                print(f"Removing directory: {item}")
-                shutil.rmtree(item_path)
-            elif os.path.isfile(item_path) and item != "put_clickpacks_here":
-                print(f"Removing file: {item}")
-                os.remove(item_path)
-        print(f"Cleared {db_dir} directory")
+        print("Generating audio previews...")
+        with concurrent.futures.ThreadPoolExecutor(args.workers) as executor:
+            names = list(db["clickpacks"])
+            results = executor.map(
+                lambda name: update_preview(db, name, dst_dir, args.previews), names
+            )
+            previews = [name for name, changed in zip(names, results) if changed]
+        print(f"Generated {len(previews)} new or updated preview(s)")
+
+    analyzed = []  # [dir_name]
+    if args.no_analysis:
+        print("Skipping audio analysis")
+    elif shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("WARN: FFmpeg not found, skipping audio analysis")
     else:
-        print(f"DB directory {db_dir} does not exist")
+        analyzed = analyze_packs(
+            db, dst_dir, args.analysis_cache, analysis_output, args.workers
+        )
+        print(f"Updated analysis for {len(analyzed)} clickpack(s)")
+
+    sort_db(db)
 
-    print("Directory cleanup complete after indexing")
+    if args.shard is not None:
+        actual_filename = save_db(db, shard_filename(args.db, index, count))
+        print(
+            f"Shard {index}/{count} consists of {len(db['clickpacks'])} entries and is saved to `{actual_filename}`"
+        )
+        print(f"Run with `--merge {count}` once all shards are built")
+        return
+
+    # only update timestamp and version if the clickpacks changed
+    if len(zips) > 0 or len(previews) > 0 or len(analyzed) > 0:
+        bump_version(db)
+        print(
+            f"Added {len(zips)} new clickpack(s), {len(previews)} preview(s) and {len(analyzed)} analysis result(s), incremented version to {db['version']}"
+        )
+    else:
+        print("No new clickpacks were added, keeping existing timestamp and version")
+
+    db["hiatus"] = hiatus_endpoint
+
+    actual_filename = save_db(db, args.db, args.debug)
+    print(
+        f"Final database consists of {len(db['clickpacks'])} entries and is saved to `{actual_filename}`"
+    )
+    total_size = sum(map(lambda x: x["size"], db["clickpacks"].values()))
+    total_uncomp_size = sum(
+        map(lambda x: x["uncompressed_size"], db["clickpacks"].values())
+    )
+    print(f"Total database size (compressed): {human_size(total_size)}")
+    print(f"Total database size (uncompressed): {human_size(total_uncomp_size)}")
+
+    if args.delete_dirs:
+        print("\n" + "=" * 50)
+        print("Delete directories mode enabled - cleaning up after indexing")
+
+        # Clear ogg directory
+        if os.path.exists(src_dir):
+            print(f"Clearing contents of {src_dir} directory...")
+            clear_dir(src_dir)
+            print(f"Cleared {src_dir} directory")
+        else:
+            print(f"Source directory {src_dir} does not exist")
+
+        # Clear db directory
+        db_dir = "db"
+        if os.path.exists(db_dir):
+            print(f"Clearing contents of {db_dir} directory...")
+            clear_dir(db_dir, keep=("put_clickpacks_here",))
+            print(f"Cleared {db_dir} directory")
+        else:
+            print(f"DB directory {db_dir} does not exist")
+
+        print("Directory cleanup complete after indexing")
+
+
+if __name__ == "__main__":
+    main()
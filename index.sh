@@ -1,3 +1,2 @@
 #!/bin/sh
-python3 audio2ogg.py
-python3 index.py
+python3 pipeline.py
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+
+"""
+Pipelined end-to-end ingest: `audio2ogg.py` and `index.py` in one run.
+
+Instead of transcoding everything before indexing anything, each clickpack
+moves through the stages on its own as soon as it is ready:
+
+    extract -> transcode -> zip (stats, zip, checksum, preview) -> commit
+
+Stages are connected by bounded queues, and at most `--max-packs` clickpacks
+are between transcoding and commit at once, so the `ogg` directory only ever
+holds that many clickpacks when `--delete-dirs` is in effect. Folders already
+in the `ogg` directory skip the transcode stage.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import queue
+import shutil
+import threading
+import time
+import traceback
+
+import audio2ogg
+import index
+
+parser = argparse.ArgumentParser(description="ClickpackDB pipelined ingest")
+parser.add_argument("--src", type=str, default="db", help="Input directory")
+parser.add_argument("--ogg", type=str, default="ogg", help="Transcoded directory")
+parser.add_argument("--dst", type=str, default="out", help="Destination directory")
+parser.add_argument("--db", type=str, default="db.json", help="Database filename")
+parser.add_argument("--debug", action="store_true", help="Enable debug mode")
+parser.add_argument(
+    "--hiatus-endpoint",
+    type=str,
+    default="https://hiatus.ruikasa.lol",
+    help="Hiatus API endpoint",
+)
+parser.add_argument(
+    "--previews", type=str, default="previews", help="Preview output directory"
+)
+parser.add_argument(
+    "--no-previews", action="store_true", help="Skip generating audio previews"
+)
+parser.add_argument(
+    "--analysis-cache",
+    type=str,
+    default="analysis.json",
+    help="Per-sound analysis cache filename",
+)
+parser.add_argument(
+    "--no-analysis", action="store_true", help="Skip analyzing clickpack audio"
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=os.cpu_count() or 1,
+    help="Number of concurrent FFmpeg conversions",
+)
+parser.add_argument(
+    "--max-packs",
+    type=int,
+    default=8,
+    help="Maximum number of clickpacks between transcoding and commit",
+)
+parser.add_argument(
+    "--queue-size", type=int, default=4, help="Capacity of each stage queue"
+)
+parser.add_argument(
+    "--save-interval",
+    type=float,
+    default=30.0,
+    help="Seconds between saves of the database while committing",
+)
+parser.add_argument(
+    "--delete-dirs",
+    action="store_false",
+    help="Remove indexed folders in db directory and clear ogg directory",
+)
+
+STOP = None  # queue sentinel
+
+
+class Stage:
+    """Accumulates how long the workers of a pipeline stage were busy."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.items += 1
+            self.busy += seconds
+
+    def report(self, wall):
+        utilization = self.busy / max(wall * self.workers, 1e-9)
+        print(
+            f"{self.name:<10} {self.workers:>7} {self.items:>6} {self.busy:>9.1f}s {utilization:>11.1%}"
+        )
+
+
+class Pack:
+    def __init__(self, name):
+        self.name = name
+        self.error = None
+        self.entry = None  # set by the zip stage
+        self.zip_path = None
+        self.preview = False
+        self.holds_slot = False
+        self.converted = False  # already in the ogg directory
+
+
+def main():
+    args = parser.parse_args()
+    hiatus_endpoint = args.hiatus_endpoint.strip("/")
+    db = index.load_db(args.db, hiatus_endpoint)
+    db_lock = threading.Lock()
+
+    os.makedirs(args.ogg, exist_ok=True)
+    os.makedirs(args.dst, exist_ok=True)
+    previews_enabled = not args.no_previews and shutil.which("ffmpeg") is not None
+    if previews_enabled:
+        os.makedirs(args.previews, exist_ok=True)
+    elif not args.no_previews:
+        print("WARN: FFmpeg not found, skipping audio previews")
+
+    extracted = queue.Queue(args.queue_size)
+    transcoded = queue.Queue(args.queue_size)
+    zipped = queue.Queue(args.queue_size)
+    # bounds how many clickpacks can occupy the ogg directory at once
+    slots = threading.BoundedSemaphore(args.max_packs)
+    ffmpeg = concurrent.futures.ThreadPoolExecutor(args.jobs)
+
+    transcode_workers = max(1, min(args.max_packs, args.jobs))
+    zip_workers = max(1, args.jobs // 2)
+    stages = {
+        "extract": Stage("extract", 1),
+        "transcode": Stage("transcode", transcode_workers),
+        "zip": Stage("zip", zip_workers),
+        "commit": Stage("commit", 1),
+    }
+
+    def timed(stage, pack, fn):
+        start = time.perf_counter()
+        try:
+            if pack.error is None:
+                fn()
+        except Exception as e:
+            # one broken clickpack must not stall the pipeline
+            traceback.print_exc()
+            pack.error = e
+            print(f"WARN: `{pack.name}` failed in {stage} stage: {e}")
+        finally:
+            stages[stage].record(time.perf_counter() - start)
+
+    def extract_stage():
+        seen = set()
+        for file in sorted(os.listdir(args.src)):
+            path = os.path.join(args.src, file)
+            name, ext = os.path.splitext(file)
+            is_archive = ext.lower() in audio2ogg.ARCHIVE_EXTENSIONS
+            if os.path.isfile(path) and is_archive:
+                pack = Pack(name)
+            elif os.path.isdir(path):
+                pack = Pack(file)
+            else:
+                continue
+            if pack.name in seen:
+                # extracting would overwrite a folder that is already in flight
+                print(f"WARN: Skipping `{file}`: `{pack.name}` is already queued")
+                clashes.append(file)
+                continue
+            seen.add(pack.name)
+
+            def extract():
+                audio2ogg.unzip_file(path, args.src)
+                # unzip_file ignores archives it can't open
+                if not os.path.isdir(os.path.join(args.src, pack.name)):
+                    raise ValueError(f"could not extract `{file}`")
+
+            if is_archive:
+                timed("extract", pack, extract)
+            extracted.put(pack)
+
+        # folders converted by an earlier `audio2ogg.py` run (or left over by
+        # an interrupted pipeline) are zipped as they are
+        for file in sorted(os.listdir(args.ogg)):
+            if file in seen or not os.path.isdir(os.path.join(args.ogg, file)):
+                continue
+            seen.add(file)
+            pack = Pack(file)
+            pack.converted = True
+            extracted.put(pack)
+
+    def transcode_stage():
+        while (pack := extracted.get()) is not STOP:
+            slots.acquire()
+            pack.holds_slot = True
+
+            def transcode():
+                src = os.path.join(args.src, pack.name)
+                out = os.path.join(args.ogg, pack.name)
+                futures = audio2ogg.convert_directory(src, out, ffmpeg)
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+
+            if not pack.converted:
+                timed("transcode", pack, transcode)
+            transcoded.put(pack)
+
+    def zip_stage():
+        while (pack := transcoded.get()) is not STOP:
+
+            def zip_pack():
+                if not os.path.isdir(os.path.join(args.ogg, pack.name)):
+                    # nothing was converted, e.g. the folder has no files
+                    raise ValueError(f"`{pack.name}` not found in `{args.ogg}`")
+                with db_lock:
+                    scratch = {"clickpacks": dict(db["clickpacks"])}
+                pack.zip_path = index.zip_dir(scratch, pack.name, args.ogg, args.dst)
+                if not pack.zip_path:
+                    return
+                pack.entry = scratch["clickpacks"][pack.name]
+                pack.entry["checksum"] = index.md5_file(pack.zip_path)
+                if previews_enabled:
+                    pack.preview = index.update_preview(
+                        scratch, pack.name, args.dst, args.previews
+                    )
+
+            timed("zip", pack, zip_pack)
+            zipped.put(pack)
+
+    added = []
+    dups = []
+    failed = []
+    clashes = []  # files in the source directory that were not indexed
+    previews = []
+
+    saved = 0  # how many of `added` are in the saved database
+
+    def commit_stage():
+        nonlocal saved
+        last_save = time.perf_counter()
+        while (pack := zipped.get()) is not STOP:
+
+            def commit():
+                if pack.zip_path == "":
+                    dups.append(pack.name)
+                    return
+                if pack.entry is None:
+                    return
+                sizes = {v["uncompressed_size"] for v in db["clickpacks"].values()}
+                # another clickpack with this size may have been committed
+                # while this one was being zipped
+                if pack.entry["uncompressed_size"] in sizes:
+                    print(f"Found duplicate `{pack.name}` while committing")
+                    os.remove(pack.zip_path)
+                    if pack.preview:
+                        os.remove(os.path.join(args.previews, pack.name + ".ogg"))
+                    dups.append(pack.name)
+                    return
+                with db_lock:
+                    db["clickpacks"][pack.name] = pack.entry
+                added.append(pack.name)
+                if pack.preview:
+                    previews.append(pack.name)
+
+            try:
+                timed("commit", pack, commit)
+                if pack.error is not None:
+                    failed.append(pack.name)
+                # a failed clickpack keeps its files so it can be retried
+                if args.delete_dirs and pack.error is None:
+                    shutil.rmtree(os.path.join(args.ogg, pack.name), ignore_errors=True)
+            finally:
+                # free the slot no matter what, or the transcode stage stalls
+                if pack.holds_slot:
+                    slots.release()
+
+            # save progress now and then instead of after every clickpack, the
+            # final save happens at the end
+            now = time.perf_counter()
+            if len(added) > saved and now - last_save >= args.save_interval:
+                last_save = now
+                try:
+                    with db_lock:
+                        index.sort_db(db)
+                        # the saved database is published as is, so it needs
+                        # a new version if the run dies before the final save
+                        index.bump_version(db)
+                        index.save_db(db, args.db, args.debug)
+                    saved = len(added)
+                except Exception as e:
+                    # the stage must keep draining its queue, or everything
+                    # upstream blocks for good
+                    print(f"WARN: Failed to save progress to `{args.db}`: {e}")
+
+    start = time.perf_counter()
+    threads = {
+        "extract": [threading.Thread(target=extract_stage)],
+        "transcode": [
+            threading.Thread(target=transcode_stage) for _ in range(transcode_workers)
+        ],
+        "zip": [threading.Thread(target=zip_stage) for _ in range(zip_workers)],
+        "commit": [threading.Thread(target=commit_stage)],
+    }
+    for stage_threads in threads.values():
+        for thread in stage_threads:
+            thread.start()
+
+    # shut stages down in order, once everything upstream has drained
+    inputs = {"transcode": extracted, "zip": transcoded, "commit": zipped}
+    for stage, stage_threads in threads.items():
+        if stage in inputs:
+            for _ in stage_threads:
+                inputs[stage].put(STOP)
+        for thread in stage_threads:
+            thread.join()
+    ffmpeg.shutdown()
+    wall = time.perf_counter() - start
+
+    print(f"\nRemoved {len(dups)} duplicates in total: {', '.join(dups)}")
+    if failed:
+        print(f"WARN: {len(failed)} clickpack(s) failed: {', '.join(failed)}")
+    if clashes:
+        print(
+            f"WARN: {len(clashes)} file(s) clashed with a clickpack of the same name: {', '.join(clashes)}"
+        )
+
+    backfilled = []
+    if previews_enabled:
+        # the zip stage only covers clickpacks committed in this run
+        print("Generating audio previews for existing clickpacks...")
+        with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+            names = list(db["clickpacks"])
+            results = executor.map(
+                lambda name: index.update_preview(db, name, args.dst, args.previews),
+                names,
+            )
+            backfilled = [name for name, changed in zip(names, results) if changed]
+        previews += backfilled
+        print(f"Generated {len(previews)} new or updated preview(s)")
+
+    analyzed = []
+    if args.no_analysis:
+        print("Skipping audio analysis")
+    elif shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("WARN: FFmpeg not found, skipping audio analysis")
+    else:
+        analyzed = index.analyze_packs(db, args.dst, args.analysis_cache)
+        print(f"Updated analysis for {len(analyzed)} clickpack(s)")
+
+    index.sort_db(db)
+    # only bump again if something changed since the last progress save
+    if len(added) > saved or len(backfilled) > 0 or len(analyzed) > 0:
+        index.bump_version(db)
+        print(
+            f"Added {len(added)} new clickpack(s), {len(previews)} preview(s) and {len(analyzed)} analysis result(s), incremented version to {db['version']}"
+        )
+    elif len(added) > 0:
+        print(
+            f"Added {len(added)} new clickpack(s), already saved as version {db['version']}"
+        )
+    else:
+        print("No new clickpacks were added, keeping existing timestamp and version")
+    db["hiatus"] = hiatus_endpoint
+    actual_filename = index.save_db(db, args.db, args.debug)
+    print(
+        f"Final database consists of {len(db['clickpacks'])} entries and is saved to `{actual_filename}`"
+    )
+
+    print(f"\nPipeline finished in {wall:.1f}s")
+    print(f"{'stage':<10} {'workers':>7} {'packs':>6} {'busy':>10} {'utilization':>11}")
+    for stage in stages.values():
+        stage.report(wall)
+
+    if args.delete_dirs:
+        print("\n" + "=" * 50)
+        print("Delete directories mode enabled - cleaning up after indexing")
+        # keep failed clickpacks (and the archives they came from) for a retry
+        failed_src = {
+            f
+            for f in os.listdir(args.src)
+            if f in failed or os.path.splitext(f)[0] in failed
+        }
+        failed_src.update(clashes)
+        if failed or clashes:
+            print(
+                f"Keeping the files of failed clickpack(s): {', '.join(failed + clashes)}"
+            )
+        for path, keep in (
+            (args.ogg, set(failed)),
+            (args.src, {"put_clickpacks_here", *failed_src}),
+        ):
+            if os.path.exists(path):
+                print(f"Clearing contents of {path} directory...")
+                index.clear_dir(path, keep=keep)
+                print(f"Cleared {path} directory")
+        print("Directory cleanup complete after indexing")
+
+
+if __name__ == "__main__":
+    main()
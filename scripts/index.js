@@ -9,6 +9,7 @@ let allClickpacks = [];
 let databaseDate = new Date();
 let isDownloadingAll = false;
 let hiatusAPI = "https://hiatus.ruikasa.lol";
+const previewAudio = new Audio();
 
 Object.defineProperty(Number.prototype, "humanSize", {
   value: function (round = false) {
@@ -41,6 +42,33 @@ function tryPopup(url, external = false) {
   loadZipFile(url);
 }
 
+function playPreview(clickpack) {
+  const url = fixupOrigin(clickpack.preview.url);
+  if (previewAudio.src === url && !previewAudio.paused) {
+    previewAudio.pause();
+    return;
+  }
+  previewAudio.src = url;
+  previewAudio.currentTime = 0;
+  previewAudio.play().catch((error) => {
+    console.error("failed to play preview for " + clickpack.id + ":", error);
+  });
+}
+
+function drawWaveform(peaks) {
+  const canvas = document.createElement("canvas");
+  canvas.className = "waveform";
+  canvas.width = peaks.length * 2;
+  canvas.height = 16;
+  const ctx = canvas.getContext("2d");
+  ctx.fillStyle = "#4a5568";
+  peaks.forEach((peak, i) => {
+    const height = Math.max(1, (peak / 100) * canvas.height);
+    ctx.fillRect(i * 2, (canvas.height - height) / 2, 1, height);
+  });
+  return canvas;
+}
+
 function countProperties(obj) {
   let count = 0;
   for (let prop in obj) {
@@ -108,13 +136,13 @@ const SITE_ORIGIN = (
 const DB_URL = SITE_ORIGIN + "/db.json";
 
 function fixupOrigin(url) {
-  const BAD_PREFIX = "https://github.com/zeozeozeo/clickpack-db/raw/main/out/";
-  const GOOD_PREFIX = SITE_ORIGIN + "/out/";
-  if (url.startsWith(BAD_PREFIX)) {
-    return GOOD_PREFIX + url.substring(BAD_PREFIX.length);
-  } else {
-    return url;
+  const BAD_ORIGIN = "https://github.com/zeozeozeo/clickpack-db/raw/main";
+  for (const dir of ["/out/", "/previews/"]) {
+    if (url.startsWith(BAD_ORIGIN + dir)) {
+      return SITE_ORIGIN + dir + url.substring(BAD_ORIGIN.length + dir.length);
+    }
   }
+  return url;
 }
 
 async function loadClickpacks() {
@@ -275,6 +303,21 @@ function renderTable(clickpacksToRender) {
       clickpackDiv.appendChild(soundTag);
     }
 
+    if (clickpack.preview) {
+      const previewTag = document.createElement("span");
+      previewTag.className = "unselectable tag";
+      previewTag.textContent = "▶ ";
+      previewTag.appendChild(drawWaveform(clickpack.preview.waveform));
+      previewTag.setAttribute(
+        "data-tippy-content",
+        `Listen to a few sounds from this clickpack (${clickpack.preview.size.humanSize(
+          true,
+        )})`,
+      );
+      previewTag.addEventListener("click", () => playPreview(clickpack));
+      clickpackDiv.appendChild(previewTag);
+    }
+
     const size = document.createElement("span");
     size.className = "unselectable tag";
     size.innerText = `💾 ${clickpack.size.humanSize(true)}`;
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+Rebuild the whole database locally with several index.py processes.
+
+Each process builds one shard (`index.py --shard K/N`) into `out/` and a
+partial database, then the partial databases are merged (`index.py --merge N`).
+On multiple machines, run the shard commands printed by this script on
+different hosts instead, gather the partial databases and `out/` contents, and
+run the merge step once.
+
+Each shard gets an equal share of the CPUs (`index.py --workers`) unless
+`--workers` is passed through explicitly. Any extra arguments are passed
+through to every index.py invocation, e.g.
+
+    python3 utils/sharded_rebuild.py --shards 4 -- --no-previews
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+INDEX_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "index.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded ClickpackDB rebuild")
+    parser.add_argument("--shards", type=int, default=2, help="Number of shards")
+    parser.add_argument(
+        "index_args", nargs="*", help="Arguments passed through to index.py"
+    )
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        print("Error: --shards must be at least 1")
+        sys.exit(1)
+
+    # every shard runs its own pools, so split the CPUs between them instead
+    # of letting each one size its pools for the whole machine
+    shard_args = list(args.index_args)
+    if "--workers" not in shard_args:
+        workers = max(1, (os.cpu_count() or 1) // args.shards)
+        shard_args += ["--workers", str(workers)]
+
+    procs = []
+    for index in range(args.shards):
+        cmd = [sys.executable, INDEX_PY, "--shard", f"{index}/{args.shards}"]
+        cmd += shard_args
+        print(f"Starting shard {index}/{args.shards}: {' '.join(cmd)}")
+        procs.append(subprocess.Popen(cmd))
+
+    failed = []
+    for index, proc in enumerate(procs):
+        if proc.wait() != 0:
+            failed.append(index)
+    if failed:
+        print(f"Error: shard(s) {', '.join(map(str, failed))} failed, not merging")
+        sys.exit(1)
+
+    cmd = [sys.executable, INDEX_PY, "--merge", str(args.shards)] + args.index_args
+    print(f"Merging: {' '.join(cmd)}")
+    sys.exit(subprocess.run(cmd).returncode)
+
+
+if __name__ == "__main__":
+    main()